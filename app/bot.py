@@ -1,4 +1,6 @@
 import io
+import asyncio
+import mimetypes
 from datetime import datetime
 
 from telegram import Bot, InputFile, Update
@@ -7,19 +9,31 @@ from telegram.ext import (
     MessageHandler,
     CallbackQueryHandler,
     CommandHandler,
+    InlineQueryHandler,
     ContextTypes,
     filters,
 )
 
-from app.config import BOT_TOKEN, CHANNEL_ID
+from app.config import (
+    BOT_TOKEN, CHANNEL_ID,
+    TG_API_BASE_URL, TG_LOCAL_MODE, UPLOAD_MAX_MB,
+)
 from app.db import SessionLocal
 from app.models import File as FileModel
+from app.prefetch import pin_video
+from app import codec
 
 from app.bot_admin import start as admin_start
 from app.bot_admin import on_callback as admin_on_callback
 from app.bot_admin import on_message as admin_on_message
+from app.bot_inline import on_inline_query
 
-bot = Bot(BOT_TOKEN)
+bot = Bot(
+    BOT_TOKEN,
+    base_url=f"{TG_API_BASE_URL}/bot",
+    base_file_url=f"{TG_API_BASE_URL}/file/bot",
+    local_mode=TG_LOCAL_MODE,
+)
 
 
 def db():
@@ -30,24 +44,49 @@ def sha_placeholder(uid: str) -> str:
     return f"tguid:{uid}"
 
 
+class UploadTooLarge(ValueError):
+    pass
+
+
 async def upload_to_channel(upload_file):
     await upload_file.seek(0)
     content = await upload_file.read()
+
+    # 可压缩的文本类文档以可寻址 zstd 帧存储，频道里的文件名带 .zst
+    index = None
+    filename = upload_file.filename
+    # 抽样熵计算与整份压缩都是 CPU 密集操作，放到线程里，避免阻塞事件循环上的下载流
+    if await asyncio.to_thread(codec.should_compress, filename, content):
+        packed, index = await asyncio.to_thread(codec.compress_frames, content)
+        if len(packed) < len(content) * 0.9:
+            content = packed
+            filename = f"{filename}.zst"
+        else:
+            index = None
+
+    if len(content) > UPLOAD_MAX_MB * 1024 * 1024:
+        raise UploadTooLarge(f"file exceeds {UPLOAD_MAX_MB} MB")
     bio = io.BytesIO(content)
-    bio.name = upload_file.filename
+    bio.name = filename
 
     msg = await bot.send_document(
         chat_id=CHANNEL_ID,
-        document=InputFile(bio, filename=upload_file.filename),
+        document=InputFile(bio, filename=filename),
         disable_notification=True
     )
 
     doc = msg.document
     tg_file = await bot.get_file(doc.file_id)
 
+    # 以文档形式发送，但视频仍记为 video，便于分类与首尾片段固定
+    guessed, _ = mimetypes.guess_type(doc.file_name or "")
+    file_type = "video" if guessed and guessed.startswith("video/") else "document"
+
     return {
         "file_id": doc.file_id,
-        "file_name": doc.file_name,
+        "file_name": upload_file.filename if index else doc.file_name,
+        "file_type": file_type,
+        "codec": index,
         "file_path": tg_file.file_path,
         "message_id": msg.message_id
     }
@@ -67,6 +106,7 @@ async def on_channel_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
         file_unique_id = None
         filename = None
         file_type = None
+        file_size = None
         tg_file = None
 
         if msg.document:
@@ -74,7 +114,10 @@ async def on_channel_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
             file_id = d.file_id
             file_unique_id = d.file_unique_id
             filename = d.file_name
-            file_type = "document"
+            # 以文件形式发到频道的视频也记为 video（与网页上传一致），才能固定首尾片段
+            mime = d.mime_type or mimetypes.guess_type(d.file_name or "")[0]
+            file_type = "video" if mime and mime.startswith("video/") else "document"
+            file_size = d.file_size
             tg_file = await context.bot.get_file(file_id)
 
         elif msg.photo:
@@ -91,6 +134,7 @@ async def on_channel_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
             file_unique_id = v.file_unique_id
             filename = v.file_name or f"video_{msg.message_id}.mp4"
             file_type = "video"
+            file_size = v.file_size
             tg_file = await context.bot.get_file(file_id)
 
         elif msg.audio:
@@ -119,15 +163,29 @@ async def on_channel_post(update: Update, context: ContextTypes.DEFAULT_TYPE):
         s.add(rec)
         s.commit()
 
+        # 后台拉取首尾片段，不阻塞后续更新的处理
+        if file_type == "video":
+            context.application.create_task(
+                pin_video(rec.id, rec.sha256, rec.tg_file_path, file_size)
+            )
+
     finally:
         s.close()
 
 
 def build_bot_app():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+    app = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .base_url(f"{TG_API_BASE_URL}/bot")
+        .base_file_url(f"{TG_API_BASE_URL}/file/bot")
+        .local_mode(TG_LOCAL_MODE)
+        .build()
+    )
 
     app.add_handler(CommandHandler("start", admin_start))
     app.add_handler(CallbackQueryHandler(admin_on_callback))
+    app.add_handler(InlineQueryHandler(on_inline_query))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, admin_on_message))
 
     app.add_handler(MessageHandler(filters.ALL, on_channel_post))
@@ -2,11 +2,13 @@ import os
 from datetime import datetime, timedelta
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
+from sqlalchemy.orm import joinedload, object_session
 
-from app.db import SessionLocal
+from app.db import SessionLocal, icontains
 from app.models import File, Share
 from app.config import BASE_URL, DOWNLOAD_SECRET
 from app.utils import sign_download_token
+from app import bulk
 
 # =========================
 # Config
@@ -36,7 +38,8 @@ def fit_name(name: str) -> str:
     return name
 
 def file_line(f: File) -> str:
-    return f"ID {f.id} | {fit_name(f.filename)} | {fmt(f.created_at)}"
+    downloads = f.stat.downloads if f.stat else 0
+    return f"ID {f.id} | {fit_name(f.filename)} | {fmt(f.created_at)} | ⬇{downloads}"
 
 def signed_download_url(file_id: int, hours: int = 24) -> str:
     exp = int((datetime.utcnow() + timedelta(hours=hours)).timestamp())
@@ -51,11 +54,17 @@ def share_active(s: Share) -> bool:
     return True
 
 def active_share(file: File) -> Share | None:
-    now = datetime.utcnow()
-    for s in file.shares:
-        if (not s.revoked) and s.expires_at > now:
-            return s
-    return None
+    # 直接在数据库里按索引过滤，不再把该文件的全部历史分享加载进来
+    return (
+        object_session(file).query(Share)
+        .filter(
+            Share.file_id == file.id,
+            Share.revoked == False,  # noqa: E712
+            Share.expires_at > datetime.utcnow(),
+        )
+        .order_by(Share.id.asc())
+        .first()
+    )
 
 # =========================
 # Keyboards
@@ -98,6 +107,37 @@ def confirm_keyboard(action: str, fid: int):
         [InlineKeyboardButton("🏠 返回主页", callback_data="nav:home")],
     ])
 
+def bulk_keyboard():
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("🔗 批量分享", callback_data="bulk:share"),
+         InlineKeyboardButton("❌ 批量取消分享", callback_data="bulk:revoke")],
+        [InlineKeyboardButton("🗑 批量删除", callback_data="bulk:delete")],
+        [InlineKeyboardButton("🏠 返回主页", callback_data="nav:home")],
+    ])
+
+def bulk_confirm_keyboard(action: str):
+    rows = [
+        [
+            InlineKeyboardButton("✅ 确认", callback_data=f"bulk_do:{action}"),
+            InlineKeyboardButton("❌ 取消", callback_data="bulk:cancel")
+        ],
+    ]
+    if action == "delete":
+        rows.insert(0, [InlineKeyboardButton(
+            "🧹 同时删除频道消息", callback_data="bulk_do:delete_msgs"
+        )])
+    rows.append([InlineKeyboardButton("🏠 返回主页", callback_data="nav:home")])
+    return InlineKeyboardMarkup(rows)
+
+def bulk_text(ids: list[int]) -> str:
+    return f"📦 当前结果共 {len(ids)} 个文件，可批量操作："
+
+async def reply_bulk_panel(message, context: ContextTypes.DEFAULT_TYPE, files: list[File]):
+    # 记住本次列表 / 搜索结果，供批量操作使用
+    ids = [f.id for f in files]
+    context.user_data["bulk_ids"] = ids
+    await message.reply_text(bulk_text(ids), reply_markup=bulk_keyboard())
+
 def expanded_keyboard(f: File):
     rows = [
         [InlineKeyboardButton("⬇️ 下载（签名）", url=signed_download_url(f.id))]
@@ -177,6 +217,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             ftype = data.split(":", 1)[1]
             files = (
                 s.query(File)
+                .options(joinedload(File.stat))
                 .filter(File.file_type == ftype)
                 .order_by(File.id.asc())
                 .all()
@@ -192,6 +233,12 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
                     file_line(f),
                     reply_markup=collapsed_keyboard(f)
                 )
+            await reply_bulk_panel(q.message, context, files)
+            return
+
+        # ---- 批量操作（作用于最近一次列表 / 搜索结果）----
+        if data.startswith("bulk:") or data.startswith("bulk_do:"):
+            await handle_bulk(q, context, s, data)
             return
 
         # ---- 文件操作（展开/收起/分享/删除等）----
@@ -229,9 +276,7 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         if action == "revoke_do":
-            for sh in f.shares:
-                sh.revoked = True
-            s.commit()
+            bulk.revoke_shares(s, conds=bulk.file_conditions(ids=[f.id]))
             await q.message.edit_reply_markup(expanded_keyboard(f))
             return
 
@@ -248,6 +293,52 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     finally:
         s.close()
 
+# =========================
+# Bulk callback
+# =========================
+async def handle_bulk(q, context: ContextTypes.DEFAULT_TYPE, s, data: str):
+    ids = context.user_data.get("bulk_ids") or []
+    if not ids:
+        await q.message.edit_text("选择已失效，请重新列出文件。", reply_markup=back_home_only())
+        return
+
+    kind, action = data.split(":", 1)
+    conds = bulk.file_conditions(ids=ids)
+
+    if kind == "bulk":
+        if action == "cancel":
+            await q.message.edit_text(bulk_text(ids), reply_markup=bulk_keyboard())
+            return
+        if action == "share":
+            shares = bulk.create_shares(s, conds)
+            await q.message.edit_text(
+                f"🔗 已为 {len(shares)} 个文件创建分享（24 小时有效）",
+                reply_markup=bulk_keyboard()
+            )
+            return
+        if action in ("revoke", "delete"):
+            verb = "取消全部分享" if action == "revoke" else "删除"
+            await q.message.edit_text(
+                f"确认{verb}这 {len(ids)} 个文件？",
+                reply_markup=bulk_confirm_keyboard(action)
+            )
+        return
+
+    if action == "revoke":
+        count = bulk.revoke_shares(s, conds=conds)
+        await q.message.edit_text(f"❌ 已撤销 {count} 个分享", reply_markup=bulk_keyboard())
+        return
+
+    if action in ("delete", "delete_msgs"):
+        count, message_ids = bulk.delete_files(s, conds)
+        context.user_data.pop("bulk_ids", None)
+        text = f"🗑 已删除 {count} 个文件"
+        if action == "delete_msgs" and message_ids:
+            removed = await bulk.delete_channel_messages(context.bot, message_ids)
+            text += f"，频道消息 {removed} 条"
+        await q.message.edit_text(text, reply_markup=back_home_only())
+        return
+
 # =========================
 # Message handler（搜索输入）
 # =========================
@@ -267,7 +358,13 @@ async def on_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         files = []
 
         if mode == "search_name":
-            files = s.query(File).filter(File.filename.contains(text)).order_by(File.id.asc()).all()
+            files = (
+                s.query(File)
+                .options(joinedload(File.stat))
+                .filter(icontains(File.filename, text))
+                .order_by(File.id.asc())
+                .all()
+            )
 
         elif mode == "search_id":
             if text.isdigit():
@@ -289,6 +386,7 @@ async def on_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 file_line(f),
                 reply_markup=collapsed_keyboard(f)
             )
+        await reply_bulk_panel(update.message, context, files)
 
     finally:
         s.close()
@@ -0,0 +1,164 @@
+import time
+import threading
+
+from sqlalchemy import case, func, or_
+from telegram import (
+    Update,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup,
+    InlineQueryResultArticle,
+    InputTextMessageContent,
+    InlineQueryResultCachedAudio,
+    InlineQueryResultCachedDocument,
+    InlineQueryResultCachedPhoto,
+    InlineQueryResultCachedVideo,
+)
+from telegram.ext import ContextTypes
+
+from app.db import SessionLocal, icontains, like_escape
+from app.models import File, FileCodec, FileStat
+from app.bot_admin import ADMIN_CHAT_ID, fit_name, fmt, signed_download_url
+
+# =========================
+# Config
+# =========================
+INLINE_PAGE_SIZE = 20       # Telegram 单次最多 50 条
+INLINE_MAX_RESULTS = 200    # 每个查询最多排序 / 缓存的结果数
+INLINE_CACHE_TTL = 30       # 秒：同一查询串在此期间不再查库
+INLINE_CACHE_SIZE = 256
+
+# =========================
+# Query cache
+# =========================
+_lock = threading.Lock()
+# key -> (过期时间, [(id, filename, file_type, tg_file_id, tg_file_path, sha256, created_at, compressed)])
+_cache: dict[str, tuple[float, list[tuple]]] = {}
+
+def _cache_get(key: str) -> list[tuple] | None:
+    now = time.monotonic()
+    with _lock:
+        hit = _cache.get(key)
+        if hit and hit[0] > now:
+            return hit[1]
+        _cache.pop(key, None)
+    return None
+
+def _cache_put(key: str, rows: list[tuple]):
+    now = time.monotonic()
+    with _lock:
+        if len(_cache) >= INLINE_CACHE_SIZE:
+            for k in [k for k, (exp, _) in _cache.items() if exp <= now]:
+                del _cache[k]
+            if len(_cache) >= INLINE_CACHE_SIZE:
+                _cache.pop(next(iter(_cache)))
+        _cache[key] = (now + INLINE_CACHE_TTL, rows)
+
+# =========================
+# Search
+# =========================
+def rank_expr(q: str):
+    """
+    排序档位（在 SQL 里计算，先排序再 LIMIT）：完全匹配 < 前缀 < 词首 < 包含
+    """
+    name = func.lower(File.filename)
+    esc = like_escape(q)
+    word_start = or_(*(
+        name.like(f"%{sep}{esc}%", escape="\\") for sep in (" ", "\\_", "-")
+    ))
+    return case(
+        (name == q, 0),
+        (name.like(f"{esc}%", escape="\\"), 1),
+        (word_start, 2),
+        else_=3,
+    )
+
+def search(text: str) -> list[tuple]:
+    key = text.strip().lower()
+    rows = _cache_get(key)
+    if rows is not None:
+        return rows
+
+    s = SessionLocal()
+    try:
+        query = (
+            s.query(
+                File.id, File.filename, File.file_type, File.tg_file_id, File.tg_file_path,
+                File.sha256, File.created_at, FileCodec.file_id.isnot(None),
+            )
+            .outerjoin(FileStat, FileStat.file_id == File.id)
+            .outerjoin(FileCodec, FileCodec.file_id == File.id)
+        )
+        if key:
+            # 同一档内：下载多的优先，其次文件名更短（更接近查询词）的优先
+            query = query.filter(icontains(File.filename, key)).order_by(
+                rank_expr(key),
+                func.coalesce(FileStat.downloads, 0).desc(),
+                func.length(File.filename),
+                File.id.desc(),
+            )
+        else:
+            query = query.order_by(File.id.desc())
+        rows = [tuple(r) for r in query.limit(INLINE_MAX_RESULTS).all()]
+    finally:
+        s.close()
+
+    _cache_put(key, rows)
+    return rows
+
+# =========================
+# Results
+# =========================
+def is_video_file(tg_file_path: str | None) -> bool:
+    # getFile 返回的路径按类型分目录：videos/… 是视频 file_id，documents/… 是文件
+    # （以文件形式发到频道的视频也记为 video，但只能作为文档转发）
+    return "videos" in (tg_file_path or "").replace("\\", "/").split("/")
+
+def to_result(row: tuple):
+    fid, filename, file_type, tg_file_id, tg_file_path, sha256, created_at, compressed = row
+    rid = str(fid)
+    title = fit_name(filename)
+    desc = f"ID {fid} | {fmt(created_at)}"
+    if compressed:
+        # 频道里存的是 zstd 帧（<name>.zst），直接转发会得到压缩数据；
+        # 改为发送经 /d 解压的签名下载链接
+        url = signed_download_url(fid)
+        return InlineQueryResultArticle(
+            rid,
+            title,
+            InputTextMessageContent(f"📄 {filename}\n{url}"),
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("⬇ 下载", url=url)]]),
+            description=f"{desc} | 链接 24h 有效",
+        )
+    # 网页上传的文件在频道里是以文档形式发送的（sha256 为真实哈希），
+    # 只有频道同步的记录（tguid:）才持有对应类型的 file_id
+    native = (sha256 or "").startswith("tguid:")
+    if native and file_type == "photo":
+        return InlineQueryResultCachedPhoto(rid, tg_file_id, title=title, description=desc)
+    if native and file_type == "video" and is_video_file(tg_file_path):
+        return InlineQueryResultCachedVideo(rid, tg_file_id, title, description=desc)
+    if native and file_type == "audio":
+        return InlineQueryResultCachedAudio(rid, tg_file_id)
+    return InlineQueryResultCachedDocument(rid, title, tg_file_id, description=desc)
+
+# =========================
+# Inline query（@bot 关键词）
+# =========================
+async def on_inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    iq = update.inline_query
+    if not iq:
+        return
+    if not iq.from_user or iq.from_user.id != ADMIN_CHAT_ID:
+        await iq.answer([], cache_time=INLINE_CACHE_TTL, is_personal=True)
+        return
+
+    rows = search(iq.query or "")
+    offset = int(iq.offset) if (iq.offset or "").isdigit() else 0
+    page = rows[offset:offset + INLINE_PAGE_SIZE]
+    next_offset = str(offset + INLINE_PAGE_SIZE) if offset + INLINE_PAGE_SIZE < len(rows) else ""
+
+    await iq.answer(
+        [to_result(r) for r in page],
+        cache_time=INLINE_CACHE_TTL,
+        is_personal=True,
+        next_offset=next_offset,
+    )
@@ -0,0 +1,124 @@
+import os
+import logging
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+from telegram import Bot
+from telegram.error import TelegramError
+
+from app.config import CHANNEL_ID
+from app.db import icontains
+from app.models import File, FileCodec, FileStat, Share
+
+logger = logging.getLogger("bulk")
+
+# Telegram deleteMessages 单次最多 100 条
+DELETE_MESSAGES_BATCH = 100
+
+# =========================
+# Selector（ID 列表 / 类型 / 文件名 / 时间范围）
+# =========================
+def file_conditions(
+    ids: list[int] | None = None,
+    file_type: str | None = None,
+    q: str | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+) -> list:
+    """
+    把筛选条件转换成 WHERE 子句列表；全部为空时抛 ValueError，
+    防止一次误操作把整个库删光。
+    """
+    conds = []
+    if ids:
+        conds.append(File.id.in_(ids))
+    if file_type:
+        conds.append(File.file_type == file_type)
+    if q:
+        conds.append(icontains(File.filename, q))
+    if created_from:
+        conds.append(File.created_at >= created_from)
+    if created_to:
+        conds.append(File.created_at < created_to)
+    if not conds:
+        raise ValueError("empty selector")
+    return conds
+
+def select_file_ids(s: Session, conds: list) -> list[int]:
+    return [fid for (fid,) in s.query(File.id).filter(*conds).order_by(File.id.asc())]
+
+# =========================
+# Bulk operations（单事务、集合式 UPDATE / DELETE）
+# =========================
+def delete_files(s: Session, conds: list) -> tuple[int, list[int]]:
+    """
+    删除匹配的文件及其全部分享，返回 (删除数量, 频道 message_id 列表)
+    """
+    rows = s.query(File.id, File.tg_message_id).filter(*conds).all()
+    if not rows:
+        return 0, []
+
+    ids = s.query(File.id).filter(*conds)
+    s.query(Share).filter(Share.file_id.in_(ids.scalar_subquery())).delete(
+        synchronize_session=False
+    )
+    for model in (FileStat, FileCodec):
+        s.query(model).filter(model.file_id.in_(ids.scalar_subquery())).delete(
+            synchronize_session=False
+        )
+    count = s.query(File).filter(*conds).delete(synchronize_session=False)
+    s.commit()
+    return count, [mid for (_, mid) in rows]
+
+def create_shares(s: Session, conds: list, expires_hours: int = 24) -> list[Share]:
+    expires_at = datetime.utcnow() + timedelta(hours=int(expires_hours))
+    shares = [
+        Share(
+            token=os.urandom(6).hex(),
+            file_id=fid,
+            expires_at=expires_at,
+            revoked=False,
+        )
+        for fid in select_file_ids(s, conds)
+    ]
+    s.add_all(shares)
+    s.commit()
+    return shares
+
+def revoke_shares(
+    s: Session,
+    share_ids: list[int] | None = None,
+    conds: list | None = None,
+) -> int:
+    """
+    按分享 ID 或按文件筛选条件批量撤销，返回受影响行数
+    """
+    query = s.query(Share).filter(Share.revoked == False)  # noqa: E712
+    if share_ids:
+        query = query.filter(Share.id.in_(share_ids))
+    if conds:
+        ids = s.query(File.id).filter(*conds)
+        query = query.filter(Share.file_id.in_(ids.scalar_subquery()))
+    if not share_ids and not conds:
+        raise ValueError("empty selector")
+    count = query.update({Share.revoked: True}, synchronize_session=False)
+    s.commit()
+    return count
+
+# =========================
+# Channel cleanup
+# =========================
+async def delete_channel_messages(bot: Bot, message_ids: list[int]) -> int:
+    """
+    分批调用 deleteMessages 删除频道中的原始消息，返回成功提交的条数；
+    单批失败只记日志，不影响数据库里已完成的删除。
+    """
+    deleted = 0
+    for i in range(0, len(message_ids), DELETE_MESSAGES_BATCH):
+        batch = message_ids[i:i + DELETE_MESSAGES_BATCH]
+        try:
+            await bot.delete_messages(chat_id=CHANNEL_ID, message_ids=batch)
+            deleted += len(batch)
+        except TelegramError as e:
+            logger.warning("delete_messages failed (%d ids): %s", len(batch), e)
+    return deleted
@@ -0,0 +1,185 @@
+import os
+import json
+import logging
+import threading
+
+from app.config import CACHE_DIR, CACHE_MAX_MB, PIN_VIDEO_HEAD_MB, PIN_VIDEO_TAIL_MB
+
+logger = logging.getLogger("cache")
+
+# =========================
+# Local byte cache
+# =========================
+# 每个文件最多三份数据：
+#   {id}.head  从 0 开始的连续字节（小文件即整份）
+#   {id}.tail  文件末尾的连续字节（视频 moov 常在这里）
+#   {id}.json  {"sha256", "size", "head", "tail", "pinned"}
+# sha256 不一致（ID 被复用）视为未命中；未固定的条目按访问时间 LRU 淘汰
+
+_lock = threading.Lock()
+
+def enabled() -> bool:
+    return CACHE_MAX_MB > 0 or pin_enabled()
+
+def pin_enabled() -> bool:
+    return PIN_VIDEO_HEAD_MB > 0 or PIN_VIDEO_TAIL_MB > 0
+
+def _path(file_id: int, ext: str) -> str:
+    return os.path.join(CACHE_DIR, f"{file_id}.{ext}")
+
+def lookup(file_id: int, sha256: str) -> dict | None:
+    if not enabled():
+        return None
+    try:
+        with open(_path(file_id, "json"), "r", encoding="utf-8") as fp:
+            meta = json.load(fp)
+    except (OSError, ValueError):
+        return None
+    if meta.get("sha256") != sha256 or not meta.get("size"):
+        return None
+    meta.setdefault("tail", 0)
+    # 更新访问时间，供 LRU 使用
+    try:
+        os.utime(_path(file_id, "json"))
+    except OSError:
+        pass
+    return meta
+
+def read_head(file_id: int, start: int, end: int) -> bytes:
+    with open(_path(file_id, "head"), "rb") as fp:
+        fp.seek(start)
+        return fp.read(end - start + 1)
+
+def read_tail(file_id: int, meta: dict, start: int, end: int) -> bytes:
+    # start / end 是文件内的绝对偏移
+    tail_start = meta["size"] - meta["tail"]
+    with open(_path(file_id, "tail"), "rb") as fp:
+        fp.seek(start - tail_start)
+        return fp.read(end - start + 1)
+
+def _read_meta(file_id: int, sha256: str) -> dict:
+    try:
+        with open(_path(file_id, "json"), "r", encoding="utf-8") as fp:
+            meta = json.load(fp)
+    except (OSError, ValueError):
+        return {}
+    return meta if meta.get("sha256") == sha256 else {}
+
+def _write(file_id: int, ext: str, data: bytes):
+    tmp = _path(file_id, f"{ext}.tmp")
+    with open(tmp, "wb") as fp:
+        fp.write(data)
+    os.replace(tmp, _path(file_id, ext))
+
+def put_segments(
+    file_id: int,
+    sha256: str,
+    size: int | None,
+    head: bytes = b"",
+    tail: bytes = b"",
+    pinned: bool = False,
+):
+    """
+    写入头部 / 尾部片段；与已有条目合并，较短的片段不会覆盖较长的
+    """
+    if not enabled() or not size or not (head or tail):
+        return
+    with _lock:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        meta = _read_meta(file_id, sha256)
+        if not meta:
+            meta = {"sha256": sha256, "size": size, "head": 0, "tail": 0, "pinned": False}
+        if len(head) > meta.get("head", 0):
+            _write(file_id, "head", head)
+            meta["head"] = len(head)
+        if len(tail) > meta.get("tail", 0):
+            _write(file_id, "tail", tail)
+            meta["tail"] = len(tail)
+        meta["pinned"] = meta.get("pinned", False) or pinned
+        with open(_path(file_id, "json"), "w", encoding="utf-8") as fp:
+            json.dump(meta, fp)
+
+def put_head(file_id: int, sha256: str, data: bytes, size: int | None):
+    put_segments(file_id, sha256, size, head=data)
+
+def remove(file_id: int):
+    with _lock:
+        for ext in ("json", "head", "tail"):
+            try:
+                os.remove(_path(file_id, ext))
+            except OSError:
+                pass
+
+def _entries() -> list[tuple[int, float, int, bool]]:
+    """
+    [(file_id, 访问时间, 占用字节, 是否固定)]
+    """
+    result = []
+    try:
+        names = os.listdir(CACHE_DIR)
+    except OSError:
+        return result
+    for name in names:
+        if not name.endswith(".json"):
+            continue
+        fid = name[:-len(".json")]
+        if not fid.isdigit():
+            continue
+        fid = int(fid)
+        try:
+            atime = os.stat(_path(fid, "json")).st_mtime
+            with open(_path(fid, "json"), "r", encoding="utf-8") as fp:
+                meta = json.load(fp)
+        except (OSError, ValueError):
+            meta = {}
+            atime = 0.0
+        result.append((fid, atime, meta.get("head", 0) + meta.get("tail", 0), bool(meta.get("pinned"))))
+    return result
+
+def evict() -> int:
+    """
+    未固定条目超出 CACHE_MAX_MB 时按最久未访问淘汰，返回淘汰条目数
+    """
+    limit = CACHE_MAX_MB * 1024 * 1024
+    entries = sorted((e for e in _entries() if not e[3]), key=lambda e: e[1])
+    total = sum(e[2] for e in entries)
+    removed = 0
+    for fid, _, size, _ in entries:
+        if total <= limit:
+            break
+        remove(fid)
+        total -= size
+        removed += 1
+    return removed
+
+def prune(valid: dict[int, str]) -> int:
+    """
+    删除已不存在（或 ID 被复用）的文件的缓存，包括固定条目；valid 为 {file_id: sha256}
+    """
+    removed = 0
+    for fid, _, _, _ in _entries():
+        sha = valid.get(fid)
+        if sha is None or not _read_meta(fid, sha):
+            remove(fid)
+            removed += 1
+    return removed
+
+def stats() -> dict:
+    entries = _entries()
+    return {
+        "enabled": enabled(),
+        "entries": len(entries),
+        "pinned": sum(1 for e in entries if e[3]),
+        "bytes": sum(e[2] for e in entries),
+        "max_bytes": CACHE_MAX_MB * 1024 * 1024,
+    }
+
+def pin_bytes(file_id: int, sha256: str, content: bytes):
+    """
+    上传时内容已在内存：直接切出首尾片段并固定
+    """
+    head_n = PIN_VIDEO_HEAD_MB * 1024 * 1024
+    tail_n = PIN_VIDEO_TAIL_MB * 1024 * 1024
+    head = content[:head_n]
+    tail = content[max(len(head), len(content) - tail_n):] if tail_n else b""
+    put_segments(file_id, sha256, len(content), head=head, tail=tail, pinned=True)
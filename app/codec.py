@@ -0,0 +1,123 @@
+import os
+import json
+import math
+from collections import Counter
+from typing import AsyncIterator, Callable
+
+try:
+    import zstandard
+except ImportError:  # 可选依赖：未安装时不压缩
+    zstandard = None
+
+from app.config import (
+    COMPRESS_UPLOADS,
+    COMPRESS_LEVEL,
+    COMPRESS_FRAME_KB,
+    COMPRESS_MIN_KB,
+    COMPRESS_MAX_ENTROPY,
+)
+
+CODEC_ZSTD = "zstd-seekable"
+SAMPLE_SIZE = 64 * 1024
+
+# 这些格式本身已压缩，不必抽样
+SKIP_EXTS = {
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar",
+    ".jpg", ".jpeg", ".png", ".gif", ".webp", ".heic",
+    ".mp3", ".m4a", ".aac", ".ogg", ".opus", ".flac",
+    ".mp4", ".mkv", ".mov", ".avi", ".webm",
+    ".pdf", ".docx", ".xlsx", ".pptx", ".apk", ".jar",
+}
+
+def available() -> bool:
+    return COMPRESS_UPLOADS and zstandard is not None
+
+# =========================
+# Entropy sample
+# =========================
+def entropy(sample: bytes) -> float:
+    """
+    Shannon 熵（bit/byte）：文本通常 4~6，已压缩 / 加密内容接近 8
+    """
+    if not sample:
+        return 0.0
+    n = len(sample)
+    return -sum(c / n * math.log2(c / n) for c in Counter(sample).values())
+
+def should_compress(filename: str, data: bytes) -> bool:
+    if not available() or len(data) < COMPRESS_MIN_KB * 1024:
+        return False
+    if os.path.splitext(filename or "")[1].lower() in SKIP_EXTS:
+        return False
+    # 头部 + 中部各抽一段，避免只看到文件头
+    mid = len(data) // 2
+    sample = data[:SAMPLE_SIZE // 2] + data[mid:mid + SAMPLE_SIZE // 2]
+    return entropy(sample) <= COMPRESS_MAX_ENTROPY
+
+# =========================
+# Encode
+# =========================
+def compress_frames(data: bytes) -> tuple[bytes, dict]:
+    """
+    按固定原始长度切帧，每帧是独立的 zstd frame，首尾相连即合法的 .zst 文件；
+    返回 (压缩数据, 帧索引)
+    """
+    frame_size = COMPRESS_FRAME_KB * 1024
+    cctx = zstandard.ZstdCompressor(level=COMPRESS_LEVEL, write_content_size=True)
+    parts = []
+    sizes = []
+    for i in range(0, len(data), frame_size):
+        frame = cctx.compress(data[i:i + frame_size])
+        parts.append(frame)
+        sizes.append(len(frame))
+    index = {
+        "codec": CODEC_ZSTD,
+        "raw_size": len(data),
+        "frame_size": frame_size,
+        "frames": sizes,
+    }
+    return b"".join(parts), index
+
+def dump_frames(sizes: list[int]) -> str:
+    return json.dumps(sizes, separators=(",", ":"))
+
+# =========================
+# Decode（按 Range 映射到帧）
+# =========================
+def frame_span(frame_size: int, sizes: list[int], start: int, end: int) -> tuple[int, int, int, int]:
+    """
+    原始区间 [start, end] -> (首帧, 末帧, 压缩数据起点, 压缩数据终点)
+    """
+    first = start // frame_size
+    last = end // frame_size
+    comp_start = sum(sizes[:first])
+    comp_end = comp_start + sum(sizes[first:last + 1]) - 1
+    return first, last, comp_start, comp_end
+
+async def iter_decompressed(
+    open_range: Callable[[int, int], AsyncIterator[bytes]],
+    frame_size: int,
+    sizes: list[int],
+    start: int,
+    end: int,
+) -> AsyncIterator[bytes]:
+    """
+    只向上游请求覆盖区间所需的帧，逐帧解压后裁剪到 [start, end]；内存占用约一帧
+    """
+    first, last, comp_start, comp_end = frame_span(frame_size, sizes, start, end)
+    dctx = zstandard.ZstdDecompressor()
+    frame = first
+    buf = bytearray()
+    async for chunk in open_range(comp_start, comp_end):
+        buf += chunk
+        while frame <= last and len(buf) >= sizes[frame]:
+            raw = dctx.decompress(bytes(buf[:sizes[frame]]))
+            del buf[:sizes[frame]]
+            raw_start = frame * frame_size
+            lo = max(start - raw_start, 0)
+            hi = min(end - raw_start + 1, len(raw))
+            if lo < hi:
+                yield raw[lo:hi]
+            frame += 1
+    if frame <= last:
+        raise IOError("truncated compressed stream")
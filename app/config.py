@@ -14,3 +14,78 @@ if not DOWNLOAD_SECRET:
     # 允许启动，但强烈建议配置，否则签名功能无法保证安全
     print("[WARN] DOWNLOAD_SECRET is empty. Signed download links will be insecure.")
 
+
+# 多实例共用 PostgreSQL 时，只让一个实例运行 Bot 轮询（其余设为 0，只提供 Web / 下载）
+RUN_BOT = os.getenv("RUN_BOT", "1").lower() in ("1", "true", "yes")
+
+# 定期维护：清理失效分享 + 增量 VACUUM / ANALYZE
+MAINTENANCE_INTERVAL_MINUTES = int(os.getenv("MAINTENANCE_INTERVAL_MINUTES", "60"))
+# 已过期分享保留多久再清除（已撤销的分享直接清除）
+SHARE_RETENTION_HOURS = int(os.getenv("SHARE_RETENTION_HOURS", "168"))
+MAINTENANCE_BATCH_SIZE = int(os.getenv("MAINTENANCE_BATCH_SIZE", "500"))
+# 每次增量 VACUUM 最多回收的页数
+VACUUM_PAGES = int(os.getenv("VACUUM_PAGES", "2000"))
+
+# 多文件 ZIP 打包下载
+ZIP_MAX_FILES = int(os.getenv("ZIP_MAX_FILES", "1000"))
+# 写当前条目时并发预取的后续条目数，以及每个条目缓冲的最大分块数
+ZIP_PREFETCH = int(os.getenv("ZIP_PREFETCH", "2"))
+ZIP_QUEUE_CHUNKS = int(os.getenv("ZIP_QUEUE_CHUNKS", "16"))
+
+# 下载缓存策略（按路由配置，留空则不发送 Cache-Control）
+# /d 签名链接仅管理员使用；/s 分享链接可交给 CDN / nginx 缓存
+DOWNLOAD_CACHE_CONTROL = os.getenv("DOWNLOAD_CACHE_CONTROL", "private, max-age=3600")
+SHARE_CACHE_CONTROL = os.getenv("SHARE_CACHE_CONTROL", "public, max-age=300")
+
+# 自建 telegram-bot-api（--local 模式）
+# TG_API_BASE_URL 例如 http://telegram-bot-api:8081，默认官方地址
+TG_API_BASE_URL = os.getenv("TG_API_BASE_URL", "https://api.telegram.org").rstrip("/")
+TG_LOCAL_MODE = os.getenv("TG_LOCAL_MODE", "").lower() in ("1", "true", "yes")
+# 本地模式下 file_path 是 bot-api 服务器上的绝对路径；
+# 若挂载点不同，用 "服务器路径前缀=本机路径前缀" 做映射（也可指向本地测试目录）
+TG_LOCAL_PATH_MAP = os.getenv("TG_LOCAL_PATH_MAP", "")
+# 上传大小上限：官方 Bot API 50 MB，本地模式 2000 MB
+UPLOAD_MAX_MB = int(os.getenv("UPLOAD_MAX_MB", "2000" if TG_LOCAL_MODE else "50"))
+
+# 下载准入控制（0 表示不限制）
+ADMISSION_GLOBAL = int(os.getenv("ADMISSION_GLOBAL", "64"))
+# 为签名下载（管理员）预留的并发名额，公开分享不能占用
+ADMISSION_ADMIN_RESERVED = int(os.getenv("ADMISSION_ADMIN_RESERVED", "8"))
+ADMISSION_PER_SHARE = int(os.getenv("ADMISSION_PER_SHARE", "4"))
+ADMISSION_PER_IP = int(os.getenv("ADMISSION_PER_IP", "4"))
+# 排队：最多等待人数 / 最长等待秒数，超出返回 503 + Retry-After
+ADMISSION_QUEUE = int(os.getenv("ADMISSION_QUEUE", "32"))
+ADMISSION_WAIT_SECONDS = float(os.getenv("ADMISSION_WAIT_SECONDS", "5"))
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "10"))
+# 带宽限制（KB/s，0 表示不限制）：单个分享流 / 全部分享合计 / 全部下载合计
+STREAM_RATE_KBPS = int(os.getenv("STREAM_RATE_KBPS", "0"))
+SHARE_RATE_KBPS = int(os.getenv("SHARE_RATE_KBPS", "0"))
+TOTAL_RATE_KBPS = int(os.getenv("TOTAL_RATE_KBPS", "0"))
+# 位于 nginx 等反代之后时，用 X-Forwarded-For 识别客户端 IP
+TRUST_FORWARDED_FOR = os.getenv("TRUST_FORWARDED_FOR", "").lower() in ("1", "true", "yes")
+
+# 访问统计：内存计数的刷库间隔（秒）
+STATS_FLUSH_SECONDS = int(os.getenv("STATS_FLUSH_SECONDS", "30"))
+# 本地字节缓存（热门文件 / 最近分享的文件头部），0 表示关闭
+CACHE_DIR = os.getenv("CACHE_DIR", "/data/cache")
+CACHE_MAX_MB = int(os.getenv("CACHE_MAX_MB", "256"))
+# 预取：间隔、热门文件数量、整份缓存的大小上限、仅缓存头部时的字节数
+PREFETCH_INTERVAL_SECONDS = int(os.getenv("PREFETCH_INTERVAL_SECONDS", "300"))
+PREFETCH_TOP_N = int(os.getenv("PREFETCH_TOP_N", "20"))
+PREFETCH_FULL_MAX_MB = int(os.getenv("PREFETCH_FULL_MAX_MB", "8"))
+PREFETCH_HEAD_KB = int(os.getenv("PREFETCH_HEAD_KB", "1024"))
+# 最近多少小时内创建的分享会预取头部
+PREFETCH_SHARE_HOURS = int(os.getenv("PREFETCH_SHARE_HOURS", "24"))
+
+# 视频首尾片段固定缓存（入库时拉取，不参与 LRU 淘汰），0 表示关闭
+PIN_VIDEO_HEAD_MB = int(os.getenv("PIN_VIDEO_HEAD_MB", "4"))
+PIN_VIDEO_TAIL_MB = int(os.getenv("PIN_VIDEO_TAIL_MB", "2"))
+
+# 上传时可选的可寻址 zstd 压缩（需要安装 zstandard），默认关闭
+COMPRESS_UPLOADS = os.getenv("COMPRESS_UPLOADS", "").lower() in ("1", "true", "yes")
+COMPRESS_LEVEL = int(os.getenv("COMPRESS_LEVEL", "3"))
+# 每个独立 zstd 帧对应的原始字节数，越小 Range 越精确、压缩率越低
+COMPRESS_FRAME_KB = int(os.getenv("COMPRESS_FRAME_KB", "1024"))
+COMPRESS_MIN_KB = int(os.getenv("COMPRESS_MIN_KB", "64"))
+# 抽样熵（bit/byte）高于此值视为已压缩内容，直接跳过
+COMPRESS_MAX_ENTROPY = float(os.getenv("COMPRESS_MAX_ENTROPY", "7.0"))
@@ -0,0 +1,113 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import Request
+
+# =========================
+# Validators（ETag / Last-Modified）
+# =========================
+def file_etag(sha256: str) -> str:
+    """
+    频道里的文件内容不可变：sha256 列（网页上传为真实 SHA-256，
+    频道同步为 tguid:<file_unique_id>）可直接作为强 ETag
+    """
+    return f'"{sha256}"'
+
+def http_date(dt: datetime | None) -> str | None:
+    if not dt:
+        return None
+    return format_datetime(dt.replace(tzinfo=timezone.utc, microsecond=0), usegmt=True)
+
+def parse_http_date(value: str | None) -> datetime | None:
+    if not value:
+        return None
+    try:
+        dt = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
+
+def _etags(value: str) -> list[str]:
+    return [t.strip() for t in value.split(",") if t.strip()]
+
+# =========================
+# Conditional requests
+# =========================
+def is_not_modified(request: Request, etag: str, modified: datetime | None) -> bool:
+    """
+    If-None-Match 优先（弱比较）；没有时才看 If-Modified-Since
+    """
+    inm = request.headers.get("if-none-match")
+    if inm is not None:
+        if inm.strip() == "*":
+            return True
+        return any(t.removeprefix("W/") == etag for t in _etags(inm))
+    since = parse_http_date(request.headers.get("if-modified-since"))
+    if since and modified:
+        return modified.replace(microsecond=0) <= since
+    return False
+
+def range_allowed(request: Request, etag: str, modified: datetime | None) -> bool:
+    """
+    If-Range：校验器仍然匹配时才按 Range 返回部分内容，否则返回完整文件
+    """
+    value = request.headers.get("if-range")
+    if not value:
+        return True
+    value = value.strip()
+    if value.startswith('"') or value.startswith("W/"):
+        # If-Range 要求强比较，弱 ETag 永不匹配
+        return value == etag
+    since = parse_http_date(value)
+    return bool(since and modified and modified.replace(microsecond=0) == since)
+
+def cache_headers(etag: str, modified: datetime | None, cache_control: str) -> dict:
+    headers = {"ETag": etag}
+    last_modified = http_date(modified)
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    return headers
+
+def parse_range(value: str | None, size: int) -> tuple[int, int] | None:
+    """
+    只解析单个区间：bytes=a-b / bytes=a- / bytes=-n；无法满足或多区间返回 None
+    """
+    value = (value or "").strip()
+    if not value.startswith("bytes=") or "," in value:
+        return None
+    a, _, b = value[len("bytes="):].strip().partition("-")
+    try:
+        if a == "":
+            n = int(b)
+            if n <= 0:
+                return None
+            return max(0, size - n), size - 1
+        start = int(a)
+        end = int(b) if b else size - 1
+    except ValueError:
+        return None
+    if start > end or start >= size:
+        return None
+    return start, min(end, size - 1)
+
+def range_not_satisfiable(value: str | None, size: int) -> bool:
+    """
+    只有格式正确的单区间、且起点超出文件末尾（或 bytes=-0）时才应回 416；
+    多区间 / 格式错误的 Range 按 RFC 9110 忽略，返回完整内容
+    """
+    value = (value or "").strip()
+    if not value.startswith("bytes=") or "," in value:
+        return False
+    a, sep, b = value[len("bytes="):].strip().partition("-")
+    if not sep:
+        return False
+    a, b = a.strip(), b.strip()
+    if a == "":
+        return b.isdigit() and int(b) == 0
+    if not a.isdigit() or (b and (not b.isdigit() or int(b) < int(a))):
+        return False
+    return int(a) >= size
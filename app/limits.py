@@ -0,0 +1,211 @@
+import time
+import asyncio
+import logging
+from collections import defaultdict
+
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+
+from app.config import (
+    ADMISSION_GLOBAL,
+    ADMISSION_ADMIN_RESERVED,
+    ADMISSION_PER_SHARE,
+    ADMISSION_PER_IP,
+    ADMISSION_QUEUE,
+    ADMISSION_WAIT_SECONDS,
+    ADMISSION_RETRY_AFTER,
+    STREAM_RATE_KBPS,
+    SHARE_RATE_KBPS,
+    TOTAL_RATE_KBPS,
+    TRUST_FORWARDED_FOR,
+)
+
+logger = logging.getLogger("limits")
+
+# 优先级：签名下载（管理员）可以使用预留名额，公开分享不行
+PRIORITY_ADMIN = "admin"
+PRIORITY_SHARE = "share"
+
+# =========================
+# Token bucket（字节 / 秒）
+# =========================
+class TokenBucket:
+    """
+    允许透支：先扣再按欠额睡眠。多个流共用一个桶时，总速率自然被限制在 rate 以内
+    """
+
+    def __init__(self, rate_bytes: float):
+        self.rate = float(rate_bytes)
+        self.capacity = self.rate
+        self.tokens = self.rate
+        self.ts = time.monotonic()
+
+    async def consume(self, n: int):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.ts) * self.rate)
+        self.ts = now
+        self.tokens -= n
+        if self.tokens < 0:
+            await asyncio.sleep(-self.tokens / self.rate)
+
+def kbps_bucket(kbps: int) -> TokenBucket | None:
+    return TokenBucket(kbps * 1024) if kbps > 0 else None
+
+total_bucket = kbps_bucket(TOTAL_RATE_KBPS)
+share_bucket = kbps_bucket(SHARE_RATE_KBPS)
+
+# =========================
+# Admission control
+# =========================
+class Ticket:
+    def __init__(self, admission: "Admission", priority: str, keys: list[str]):
+        self.admission = admission
+        self.priority = priority
+        self.keys = keys
+        self.released = False
+        self.buckets = [b for b in (
+            kbps_bucket(STREAM_RATE_KBPS) if priority == PRIORITY_SHARE else None,
+            share_bucket if priority == PRIORITY_SHARE else None,
+            total_bucket,
+        ) if b]
+
+    async def throttle(self, n: int):
+        for b in self.buckets:
+            await b.consume(n)
+
+    def release(self):
+        # 生成器 finally 与 AdmittedResponse 都会调用，只生效一次
+        if not self.released:
+            self.released = True
+            self.admission.release(self)
+
+
+class Admission:
+    def __init__(self):
+        self.active = 0
+        self.waiting = 0
+        self.by_key: dict[str, int] = defaultdict(int)
+        self.cond = asyncio.Condition()
+
+    def _limit_for(self, key: str) -> int:
+        if key.startswith("share:"):
+            return ADMISSION_PER_SHARE
+        if key.startswith("ip:"):
+            return ADMISSION_PER_IP
+        return 0
+
+    def _fits(self, priority: str, keys: list[str]) -> bool:
+        limit = ADMISSION_GLOBAL
+        if priority != PRIORITY_ADMIN:
+            limit -= ADMISSION_ADMIN_RESERVED
+        if ADMISSION_GLOBAL > 0 and self.active >= limit:
+            return False
+        for key in keys:
+            lim = self._limit_for(key)
+            if lim > 0 and self.by_key[key] >= lim:
+                return False
+        return True
+
+    def _take(self, priority: str, keys: list[str]) -> Ticket:
+        self.active += 1
+        for key in keys:
+            self.by_key[key] += 1
+        return Ticket(self, priority, keys)
+
+    async def acquire(self, priority: str, keys: list[str]) -> Ticket:
+        async with self.cond:
+            if self._fits(priority, keys):
+                return self._take(priority, keys)
+            if self.waiting >= ADMISSION_QUEUE:
+                raise overloaded()
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(
+                    self.cond.wait_for(lambda: self._fits(priority, keys)),
+                    timeout=ADMISSION_WAIT_SECONDS,
+                )
+            except asyncio.TimeoutError:
+                raise overloaded()
+            finally:
+                self.waiting -= 1
+            return self._take(priority, keys)
+
+    def release(self, ticket: Ticket):
+        self.active -= 1
+        for key in ticket.keys:
+            self.by_key[key] -= 1
+            if self.by_key[key] <= 0:
+                del self.by_key[key]
+        try:
+            asyncio.get_running_loop().create_task(self._notify())
+        except RuntimeError:
+            pass
+
+    async def _notify(self):
+        async with self.cond:
+            self.cond.notify_all()
+
+    def stats(self) -> dict:
+        return {"active": self.active, "waiting": self.waiting}
+
+
+admission = Admission()
+
+def overloaded() -> HTTPException:
+    return HTTPException(
+        503,
+        "too many concurrent downloads",
+        headers={"Retry-After": str(ADMISSION_RETRY_AFTER)},
+    )
+
+def client_ip(request: Request) -> str:
+    if TRUST_FORWARDED_FOR:
+        fwd = request.headers.get("x-forwarded-for")
+        if fwd:
+            return fwd.split(",", 1)[0].strip()
+        real = request.headers.get("x-real-ip")
+        if real:
+            return real.strip()
+    return request.client.host if request.client else "-"
+
+async def admit(request: Request, priority: str, share_token: str | None = None) -> Ticket:
+    keys = []
+    if priority == PRIORITY_SHARE:
+        keys.append(f"ip:{client_ip(request)}")
+        if share_token:
+            keys.append(f"share:{share_token}")
+    return await admission.acquire(priority, keys)
+
+class AdmittedResponse(Response):
+    """
+    包装任意响应：无论正常结束、客户端断开还是异常，都在响应结束后归还名额
+    """
+
+    def __init__(self, inner: Response, ticket: Ticket):
+        self.inner = inner
+        self.ticket = ticket
+        self.status_code = inner.status_code
+        self.background = None
+
+    @property
+    def headers(self):
+        return self.inner.headers
+
+    async def __call__(self, scope, receive, send):
+        if self.background is not None and self.inner.background is None:
+            self.inner.background = self.background
+        try:
+            await self.inner(scope, receive, send)
+        finally:
+            self.ticket.release()
+
+async def shaped(chunks, ticket: Ticket):
+    """
+    包装字节流：按令牌桶限速，结束（包括客户端断开）时归还名额
+    """
+    try:
+        async for c in chunks:
+            await ticket.throttle(len(c))
+            yield c
+    finally:
+        ticket.release()
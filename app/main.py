@@ -3,8 +3,9 @@ import logging
 import asyncio
 import io
 import urllib.parse
+import mimetypes
+import json
 from datetime import datetime, timedelta
-import httpx
 import os
 
 from fastapi import (
@@ -16,18 +17,46 @@ from fastapi.responses import (
     JSONResponse,
     Response,
     RedirectResponse,
+    FileResponse,
 )
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from pydantic import BaseModel
+from sqlalchemy.orm import Session, joinedload
 
 from telegram import Update
 
-from app.db import init_db, SessionLocal
-from app.models import File as FileModel, Share
-from app.bot import upload_to_channel, build_bot_app
-from app.config import BOT_TOKEN, API_TOKEN, BASE_URL, DOWNLOAD_SECRET
-from app.utils import sha256_bytes, sign_download_token, verify_download_token
+from app.db import init_db, SessionLocal, icontains
+from app.models import File as FileModel, FileCodec, Share
+from app.bot import bot, upload_to_channel, build_bot_app, UploadTooLarge
+from app import bulk
+from app.maintenance import maintenance_loop, run_maintenance, get_stats
+from app.config import (
+    API_TOKEN, BASE_URL, DOWNLOAD_SECRET,
+    ZIP_MAX_FILES, ZIP_PREFETCH, ZIP_QUEUE_CHUNKS,
+    DOWNLOAD_CACHE_CONTROL, SHARE_CACHE_CONTROL,
+    RUN_BOT,
+)
+from app.utils import (
+    sha256_bytes,
+    sign_download_token, verify_download_token,
+    sign_zip_token, verify_zip_token,
+)
+from app.zipstream import ZipEntry, stream_zip
+from app.upstream import (
+    local_file_path, iter_telegram_bytes, iter_range,
+    open_telegram_stream, close_telegram_stream,
+)
+from app.limits import (
+    admit, shaped, AdmittedResponse, admission,
+    PRIORITY_ADMIN, PRIORITY_SHARE,
+)
+from app.httpcache import (
+    file_etag, is_not_modified, range_allowed, cache_headers, parse_range,
+    range_not_satisfiable,
+)
+from app import cache, stats, codec
+from app.prefetch import last_run as prefetch_last_run
 from app.auth import verify_api_or_cookie
 
 # =========================
@@ -47,6 +76,10 @@ app.mount("/static", StaticFiles(directory="app/static"), name="static")
 templates = Jinja2Templates(directory="app/templates")
 
 bot_thread: threading.Thread | None = None
+maintenance_thread: threading.Thread | None = None
+maintenance_stop = threading.Event()
+stats_thread: threading.Thread | None = None
+stats_stop = threading.Event()
 
 # =========================
 # Helpers
@@ -54,18 +87,19 @@ bot_thread: threading.Thread | None = None
 def now_utc() -> datetime:
     return datetime.utcnow()
 
-def content_disposition(filename: str) -> str:
+def content_disposition(filename: str, inline: bool = False) -> str:
     quoted = urllib.parse.quote(filename)
-    return f'attachment; filename="download"; filename*=UTF-8\'\'{quoted}'
-
-def is_full_url(v: str) -> bool:
-    return v.startswith("http://") or v.startswith("https://")
-
-def build_tg_download_url(path: str) -> str:
-    path = (path or "").strip()
-    if is_full_url(path):
-        return path
-    return f"https://api.telegram.org/file/bot{BOT_TOKEN}/{path.lstrip('/')}"
+    kind = "inline" if inline else "attachment"
+    return f'{kind}; filename="download"; filename*=UTF-8\'\'{quoted}'
+
+def media_type_for(f: FileModel) -> str:
+    # 视频给出真实类型并 inline，浏览器才会直接播放
+    if f.file_type == "video":
+        guessed, _ = mimetypes.guess_type(f.filename or "")
+        if guessed and guessed.startswith("video/"):
+            return guessed
+        return "video/mp4"
+    return "application/octet-stream"
 
 def share_active(share: Share) -> bool:
     if share.revoked:
@@ -79,6 +113,11 @@ def make_signed_download_url(file_id: int, hours: int = 24) -> str:
     tok = sign_download_token(file_id, exp, DOWNLOAD_SECRET)
     return f"{BASE_URL}/d/{tok}"
 
+def make_signed_zip_url(file_ids: list[int], hours: int = 24) -> str:
+    exp = int((now_utc() + timedelta(hours=hours)).timestamp())
+    tok = sign_zip_token(file_ids, exp, DOWNLOAD_SECRET)
+    return f"{BASE_URL}/z/{tok}"
+
 # =========================
 # Bot runner
 # =========================
@@ -95,6 +134,7 @@ def run_bot_polling():
         allowed_updates=[
             "message",
             "callback_query",
+            "inline_query",
             "channel_post",
             "edited_channel_post",
         ],
@@ -105,13 +145,32 @@ def run_bot_polling():
 # =========================
 @app.on_event("startup")
 def startup():
-    global bot_thread
+    global bot_thread, maintenance_thread, stats_thread
     init_db()
-    bot_thread = threading.Thread(
-        target=run_bot_polling,
+    if RUN_BOT:
+        bot_thread = threading.Thread(
+            target=run_bot_polling,
+            daemon=True
+        )
+        bot_thread.start()
+    maintenance_thread = threading.Thread(
+        target=maintenance_loop,
+        args=(maintenance_stop,),
         daemon=True
     )
-    bot_thread.start()
+    maintenance_thread.start()
+    stats_thread = threading.Thread(
+        target=stats.stats_loop,
+        args=(stats_stop,),
+        daemon=True
+    )
+    stats_thread.start()
+
+@app.on_event("shutdown")
+def shutdown():
+    maintenance_stop.set()
+    stats_stop.set()
+    stats.flush()
 
 # =========================
 # DB
@@ -159,13 +218,18 @@ def api_files(
     db: Session = Depends(get_db),
     _: None = Depends(verify_api_or_cookie)
 ):
-    query = db.query(FileModel)
+    query = db.query(FileModel).options(joinedload(FileModel.stat))
     if q:
-        query = query.filter(FileModel.filename.contains(q))
+        query = query.filter(icontains(FileModel.filename, q))
     files = query.order_by(FileModel.id.desc()).all()
+    # 尚未刷库的计数也算上
+    pending = stats.pending()
 
     result = []
     for f in files:
+        d, h, at = pending.get(f.id, (0, 0, None))
+        # 尚未刷库的访问时间比库里的新
+        at = at or (f.stat.last_access_at if f.stat else None)
         shares = []
         for s in f.shares:
             shares.append({
@@ -181,6 +245,9 @@ def api_files(
             "created_at": f.created_at.isoformat(),
             "download_url": make_signed_download_url(f.id, hours=24),
             "shares": shares,
+            "downloads": (f.stat.downloads if f.stat else 0) + d,
+            "share_hits": (f.stat.share_hits if f.stat else 0) + h,
+            "last_access_at": at.isoformat() if at else None,
         })
     return result
 
@@ -198,7 +265,10 @@ async def api_upload(
 
     # 上传到频道（不落地）
     new_file = UploadFile(filename=file.filename, file=io.BytesIO(data))
-    result = await upload_to_channel(new_file)
+    try:
+        result = await upload_to_channel(new_file)
+    except UploadTooLarge as e:
+        raise HTTPException(413, str(e))
 
     # 去重：tg_file_id
     exist = db.query(FileModel).filter_by(tg_file_id=result["file_id"]).first()
@@ -207,15 +277,28 @@ async def api_upload(
 
     rec = FileModel(
         filename=result["file_name"],
+        file_type=result["file_type"],
         sha256=sha256,
         tg_file_id=result["file_id"],
         tg_file_path=result["file_path"],
         tg_message_id=result["message_id"],
         created_at=now_utc(),
     )
+    if result["codec"]:
+        index = result["codec"]
+        rec.codec = FileCodec(
+            codec=index["codec"],
+            raw_size=index["raw_size"],
+            frame_size=index["frame_size"],
+            frames=codec.dump_frames(index["frames"]),
+        )
     db.add(rec)
     db.commit()
     db.refresh(rec)
+
+    # 视频：内容已在内存里，直接固定首尾片段
+    if rec.file_type == "video":
+        await asyncio.to_thread(cache.pin_bytes, rec.id, rec.sha256, data)
     return {"id": rec.id, "deduplicated": False}
 
 # =========================
@@ -270,11 +353,86 @@ def api_delete_file(
     db.commit()
     return {"ok": True}
 
+# =========================
+# Bulk operations（管理员鉴权，单事务）
+# =========================
+class FileSelector(BaseModel):
+    ids: list[int] = []
+    file_type: str | None = None
+    q: str | None = None
+    created_from: datetime | None = None
+    created_to: datetime | None = None
+
+    def conditions(self, required: bool = True) -> list | None:
+        try:
+            return bulk.file_conditions(
+                ids=self.ids,
+                file_type=self.file_type,
+                q=self.q,
+                created_from=self.created_from,
+                created_to=self.created_to,
+            )
+        except ValueError:
+            if not required:
+                return None
+            raise HTTPException(400, "empty selector")
+
+class BulkDeleteRequest(FileSelector):
+    delete_messages: bool = False
+
+class BulkShareRequest(FileSelector):
+    expires_hours: int = 24
+
+class BulkRevokeRequest(FileSelector):
+    share_ids: list[int] = []
+
+@app.post("/api/files/bulk/delete")
+async def api_bulk_delete(
+    body: BulkDeleteRequest,
+    db: Session = Depends(get_db),
+    _: None = Depends(verify_api_or_cookie)
+):
+    count, message_ids = bulk.delete_files(db, body.conditions())
+    removed = 0
+    if body.delete_messages and message_ids:
+        removed = await bulk.delete_channel_messages(bot, message_ids)
+    return {"ok": True, "deleted": count, "messages_deleted": removed}
+
+@app.post("/api/share/bulk")
+def api_bulk_share_create(
+    body: BulkShareRequest,
+    db: Session = Depends(get_db),
+    _: None = Depends(verify_api_or_cookie)
+):
+    shares = bulk.create_shares(db, body.conditions(), body.expires_hours)
+    return {
+        "ok": True,
+        "shares": [
+            {"file_id": sh.file_id, "url": f"{BASE_URL}/s/{sh.token}"}
+            for sh in shares
+        ],
+    }
+
+@app.post("/api/share/bulk/revoke")
+def api_bulk_share_revoke(
+    body: BulkRevokeRequest,
+    db: Session = Depends(get_db),
+    _: None = Depends(verify_api_or_cookie)
+):
+    try:
+        count = bulk.revoke_shares(
+            db,
+            share_ids=body.share_ids,
+            conds=body.conditions(required=False),
+        )
+    except ValueError:
+        raise HTTPException(400, "empty selector")
+    return {"ok": True, "revoked": count}
+
 # =========================
 # Public Download: signed token
 # =========================
-@app.get("/d/{token}")
-async def download_signed(token: str, request: Request, db: Session = Depends(get_db)):
+def resolve_signed_file(token: str, db: Session) -> FileModel:
     if not DOWNLOAD_SECRET:
         raise HTTPException(500, "DOWNLOAD_SECRET not configured")
     try:
@@ -286,11 +444,17 @@ async def download_signed(token: str, request: Request, db: Session = Depends(ge
     f = db.query(FileModel).get(file_id)
     if not f:
         raise HTTPException(404)
-    return await stream_telegram_file(f, request)
+    return f
 
+@app.get("/d/{token}")
 @app.head("/d/{token}")
-def download_signed_head(token: str):
-    return Response(status_code=200, headers={"Accept-Ranges": "bytes"})
+async def download_signed(token: str, request: Request, db: Session = Depends(get_db)):
+    f = resolve_signed_file(token, db)
+    return await stream_telegram_file(
+        f, request,
+        cache_control=DOWNLOAD_CACHE_CONTROL,
+        priority=PRIORITY_ADMIN,
+    )
 
 # =========================
 # Share Download
@@ -305,34 +469,298 @@ async def download_share(
     share = db.query(Share).filter_by(token=token).first()
     if not share or not share_active(share):
         raise HTTPException(404)
-    return await stream_telegram_file(share.file, request)
+    return await stream_telegram_file(
+        share.file, request,
+        cache_control=SHARE_CACHE_CONTROL,
+        priority=PRIORITY_SHARE,
+        share_token=share.token,
+    )
+
+# =========================
+# ZIP download（多文件打包，流式 ZIP64）
+# =========================
+@app.post("/api/zip")
+def api_zip_create(
+    body: FileSelector,
+    db: Session = Depends(get_db),
+    _: None = Depends(verify_api_or_cookie)
+):
+    ids = bulk.select_file_ids(db, body.conditions())
+    if not ids:
+        raise HTTPException(404)
+    if len(ids) > ZIP_MAX_FILES:
+        raise HTTPException(400, f"too many files (max {ZIP_MAX_FILES})")
+    return {"url": make_signed_zip_url(ids), "count": len(ids)}
+
+@app.get("/z/{token}")
+async def download_zip(token: str, request: Request, db: Session = Depends(get_db)):
+    if not DOWNLOAD_SECRET:
+        raise HTTPException(500, "DOWNLOAD_SECRET not configured")
+    try:
+        file_ids, exp = verify_zip_token(token, DOWNLOAD_SECRET)
+    except Exception:
+        raise HTTPException(404)
+    if int(now_utc().timestamp()) > exp:
+        raise HTTPException(404)
+
+    by_id = {
+        f.id: f for f in db.query(FileModel).filter(FileModel.id.in_(file_ids))
+    }
+    # 按 ID 升序打包；已删除的文件直接跳过
+    entries = [
+        ZipEntry(
+            name=by_id[fid].filename,
+            modified=by_id[fid].created_at or now_utc(),
+            open=lambda f=by_id[fid]: iter_file_bytes(f),
+        )
+        for fid in file_ids if fid in by_id
+    ]
+    if not entries:
+        raise HTTPException(404)
+
+    ticket = await admit(request, PRIORITY_ADMIN)
+    body = stream_zip(entries, prefetch=ZIP_PREFETCH, queue_chunks=ZIP_QUEUE_CHUNKS)
+    return AdmittedResponse(StreamingResponse(
+        shaped(body, ticket),
+        headers={"Content-Disposition": content_disposition("files.zip")},
+        media_type="application/zip"
+    ), ticket)
 
 # =========================
 # Core stream（支持 Range）
 # =========================
-async def stream_telegram_file(f: FileModel, request: Request):
-    tg_url = build_tg_download_url(f.tg_file_path)
-    range_header = request.headers.get("range")
-    headers = {}
+def iter_file_bytes(f: FileModel):
+    """
+    完整的原始文件内容（压缩存储的文件在这里解压）
+    """
+    if f.codec:
+        return iter_codec_range(f, 0, f.codec.raw_size - 1)
+    return iter_telegram_bytes(f.tg_file_path)
+
+def iter_codec_range(f: FileModel, start: int, end: int):
+    return codec.iter_decompressed(
+        lambda a, b: iter_range(f.tg_file_path, a, b),
+        f.codec.frame_size,
+        json.loads(f.codec.frames),
+        start,
+        end,
+    )
+
+def codec_response(
+    f: FileModel,
+    range_header: str | None,
+    resp_headers: dict,
+    media_type: str,
+    ticket,
+) -> Response:
+    """
+    压缩存储的文件：对外按原始大小提供 Range，只拉取覆盖区间的帧
+    """
+    size = f.codec.raw_size
+    resp_headers = dict(resp_headers)
+    status = 200
+    start, end = 0, size - 1
+    if range_header:
+        rng = parse_range(range_header, size)
+        if rng:
+            start, end = rng
+            status = 206
+            resp_headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        elif range_not_satisfiable(range_header, size):
+            raise HTTPException(416, headers={"Content-Range": f"bytes */{size}"})
+    resp_headers["Content-Length"] = str(end - start + 1)
+
+    return AdmittedResponse(StreamingResponse(
+        shaped(iter_codec_range(f, start, end), ticket),
+        status_code=status,
+        headers=resp_headers,
+        media_type=media_type
+    ), ticket)
+
+CACHE_CHUNK = 256 * 1024
+
+def cached_response(
+    f: FileModel,
+    meta: dict,
+    range_header: str | None,
+    resp_headers: dict,
+    media_type: str,
+    ticket,
+) -> Response | None:
+    """
+    请求区间与本地头部 / 尾部片段有交集：本地部分直接发出，
+    中间缺的部分在开始发送时就并发向上游请求；完全不相交返回 None 走普通代理
+    """
+    size, head, tail = meta["size"], meta["head"], meta["tail"]
+    tail_start = size - tail if tail else size
     if range_header:
-        headers["Range"] = range_header
+        rng = parse_range(range_header, size)
+        if rng is None:
+            return None
+        start, end = rng
+        status = 206
+        resp_headers = {**resp_headers, "Content-Range": f"bytes {start}-{end}/{size}"}
+    else:
+        start, end, status = 0, size - 1, 200
+        resp_headers = dict(resp_headers)
+
+    # 切成 head / upstream / tail 三段（任意一段可能为空）
+    pieces = []
+    pos = start
+    if pos < head:
+        e = min(end, head - 1)
+        pieces.append(("head", pos, e))
+        pos = e + 1
+    if pos <= end and pos < tail_start:
+        e = min(end, tail_start - 1)
+        pieces.append(("upstream", pos, e))
+        pos = e + 1
+    if pos <= end:
+        pieces.append(("tail", pos, end))
+    if all(kind == "upstream" for kind, _, _ in pieces):
+        return None
+    resp_headers["Content-Length"] = str(end - start + 1)
 
     async def gen():
-        async with httpx.AsyncClient(timeout=None) as client:
-            async with client.stream("GET", tg_url, headers=headers) as r:
-                r.raise_for_status()
-                async for c in r.aiter_bytes():
-                    yield c
-
-    return StreamingResponse(
-        gen(),
-        status_code=206 if range_header else 200,
-        headers={
-            "Content-Disposition": content_disposition(f.filename),
-            "Accept-Ranges": "bytes",
-        },
-        media_type="application/octet-stream"
-    )
+        upstream = None
+        r = None
+        for kind, a, b in pieces:
+            if kind == "upstream":
+                upstream = asyncio.create_task(open_telegram_stream(
+                    f.tg_file_path, {"Range": f"bytes={a}-{b}"}
+                ))
+        try:
+            for kind, a, b in pieces:
+                if kind == "upstream":
+                    r = await upstream
+                    try:
+                        async for c in r.aiter_bytes():
+                            yield c
+                    finally:
+                        await close_telegram_stream(r)
+                    continue
+                if kind == "head":
+                    data = await asyncio.to_thread(cache.read_head, f.id, a, b)
+                else:
+                    data = await asyncio.to_thread(cache.read_tail, f.id, meta, a, b)
+                for i in range(0, len(data), CACHE_CHUNK):
+                    yield data[i:i + CACHE_CHUNK]
+        finally:
+            if upstream and not upstream.done():
+                upstream.cancel()
+            elif upstream and r is None and not upstream.cancelled() and not upstream.exception():
+                await close_telegram_stream(upstream.result())
+
+    return AdmittedResponse(StreamingResponse(
+        shaped(gen(), ticket),
+        status_code=status,
+        headers=resp_headers,
+        media_type=media_type
+    ), ticket)
+
+async def stream_telegram_file(
+    f: FileModel,
+    request: Request,
+    cache_control: str = "",
+    priority: str = PRIORITY_ADMIN,
+    share_token: str | None = None,
+):
+    etag = file_etag(f.sha256)
+    validators = cache_headers(etag, f.created_at, cache_control)
+    media_type = media_type_for(f)
+    resp_headers = {
+        **validators,
+        "Content-Disposition": content_disposition(f.filename, inline=f.file_type == "video"),
+        "Accept-Ranges": "bytes",
+    }
+
+    is_share = priority == PRIORITY_SHARE
+
+    # 304：浏览器 / CDN 已有副本，完全不访问 Telegram
+    if is_not_modified(request, etag, f.created_at):
+        if is_share:
+            stats.record_hit(f.id, download=False, share=True)
+        return Response(status_code=304, headers=validators)
+
+    if request.method == "HEAD":
+        if f.codec:
+            resp_headers["Content-Length"] = str(f.codec.raw_size)
+            return Response(status_code=200, headers=resp_headers, media_type=media_type)
+        path = local_file_path(f.tg_file_path)
+        if path:
+            return FileResponse(path, headers=resp_headers, media_type=media_type)
+        return Response(status_code=200, headers=resp_headers, media_type=media_type)
+
+    range_header = request.headers.get("range")
+    if range_header and not range_allowed(request, etag, f.created_at):
+        range_header = None
+
+    # 准入控制：超出并发 / 排队超时直接 503 + Retry-After，不占用上游连接
+    ticket = await admit(request, priority, share_token)
+
+    # 播放器的后续 Range 请求不重复计数
+    counted = not range_header or range_header.replace(" ", "").startswith("bytes=0-")
+    stats.record_hit(f.id, download=counted, share=is_share)
+
+    try:
+        if f.codec:
+            return codec_response(f, range_header, resp_headers, media_type, ticket)
+
+        # 本地 Bot API：直接读共享卷，Range / If-Range 由 FileResponse 原生处理（只限并发，不限速）
+        path = local_file_path(f.tg_file_path)
+        if path:
+            return AdmittedResponse(FileResponse(
+                path,
+                headers=resp_headers,
+                media_type=media_type
+            ), ticket)
+
+        # 本地字节缓存命中（热门文件 / 最近分享的文件头部）
+        meta = await asyncio.to_thread(cache.lookup, f.id, f.sha256)
+        if meta:
+            resp = cached_response(f, meta, range_header, resp_headers, media_type, ticket)
+            if resp:
+                return resp
+
+        headers = {"Range": range_header} if range_header else {}
+        r = await open_telegram_stream(f.tg_file_path, headers)
+    except BaseException:
+        ticket.release()
+        raise
+
+    for name in ("Content-Length", "Content-Range"):
+        if name in r.headers:
+            resp_headers[name] = r.headers[name]
+
+    async def gen():
+        try:
+            async for c in r.aiter_bytes():
+                yield c
+        finally:
+            await close_telegram_stream(r)
+
+    return AdmittedResponse(StreamingResponse(
+        shaped(gen(), ticket),
+        status_code=r.status_code,
+        headers=resp_headers,
+        media_type=media_type
+    ), ticket)
+
+# =========================
+# Maintenance（管理员鉴权）
+# =========================
+@app.get("/api/maintenance")
+def api_maintenance_stats(_: None = Depends(verify_api_or_cookie)):
+    return {
+        **get_stats(),
+        "downloads": admission.stats(),
+        "cache": cache.stats(),
+        "prefetch": prefetch_last_run(),
+    }
+
+@app.post("/api/maintenance/run")
+async def api_maintenance_run(_: None = Depends(verify_api_or_cookie)):
+    return await asyncio.to_thread(run_maintenance)
 
 # =========================
 # Health
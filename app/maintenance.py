@@ -0,0 +1,169 @@
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import cache
+from app.db import SessionLocal, engine, is_sqlite
+from app.models import File, FileCodec, FileStat, Share
+from app.config import (
+    MAINTENANCE_INTERVAL_MINUTES,
+    SHARE_RETENTION_HOURS,
+    MAINTENANCE_BATCH_SIZE,
+    VACUUM_PAGES,
+)
+
+logger = logging.getLogger("maintenance")
+
+# =========================
+# Run stats（/api/maintenance 对外暴露）
+# =========================
+_stats_lock = threading.Lock()
+_run_lock = threading.Lock()
+_stats = {
+    "runs": 0,
+    "last_run_at": None,
+    "last_duration_ms": None,
+    "last_error": None,
+    "last": {},
+    "totals": {"shares_purged": 0, "orphans_pruned": 0},
+    "db": {},
+}
+
+def get_stats() -> dict:
+    with _stats_lock:
+        return {
+            **_stats,
+            "last": dict(_stats["last"]),
+            "totals": dict(_stats["totals"]),
+            "db": dict(_stats["db"]),
+        }
+
+# =========================
+# Steps
+# =========================
+def purge_dead_shares(s: Session, now: datetime, batch_size: int = MAINTENANCE_BATCH_SIZE) -> int:
+    """
+    分批删除已撤销、或过期超过保留期的分享；每批单独提交，避免长时间持有写锁
+    """
+    cutoff = now - timedelta(hours=SHARE_RETENTION_HOURS)
+    dead = (Share.revoked == True) | (Share.expires_at < cutoff)  # noqa: E712
+    purged = 0
+    while True:
+        ids = [sid for (sid,) in s.query(Share.id).filter(dead).limit(batch_size)]
+        if not ids:
+            break
+        purged += s.query(Share).filter(Share.id.in_(ids)).delete(synchronize_session=False)
+        s.commit()
+    return purged
+
+def prune_orphans(s: Session) -> int:
+    """
+    删除指向不存在文件的分享 / 访问统计 / 压缩索引（旧版本逐条删除时可能遗留）
+    """
+    files = s.query(File.id).scalar_subquery()
+    count = s.query(Share).filter(~Share.file_id.in_(files)).delete(synchronize_session=False)
+    for model in (FileStat, FileCodec):
+        count += s.query(model).filter(~model.file_id.in_(files)).delete(synchronize_session=False)
+    s.commit()
+    return count
+
+def compact() -> dict:
+    if not is_sqlite():
+        return compact_postgres()
+    return compact_sqlite()
+
+def compact_sqlite() -> dict:
+    """
+    SQLite：首次把 auto_vacuum 切到 INCREMENTAL（需要一次完整 VACUUM），
+    之后每轮只回收有限页数，并执行 ANALYZE 刷新统计信息
+    """
+    info = {"backend": "sqlite"}
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        mode = conn.execute(text("PRAGMA auto_vacuum")).scalar()
+        if mode != 2:
+            conn.execute(text("PRAGMA auto_vacuum = INCREMENTAL"))
+            conn.execute(text("VACUUM"))
+            info["converted_to_incremental"] = True
+        free_before = conn.execute(text("PRAGMA freelist_count")).scalar()
+        conn.execute(text(f"PRAGMA incremental_vacuum({int(VACUUM_PAGES)})"))
+        conn.execute(text("ANALYZE"))
+        page_size = conn.execute(text("PRAGMA page_size")).scalar()
+        page_count = conn.execute(text("PRAGMA page_count")).scalar()
+        free_after = conn.execute(text("PRAGMA freelist_count")).scalar()
+    info["pages_reclaimed"] = free_before - free_after
+    info["size_bytes"] = page_size * page_count
+    info["free_pages"] = free_after
+    return info
+
+def compact_postgres() -> dict:
+    """
+    PostgreSQL：空间回收交给 autovacuum；这里只对刚批量删除过的表
+    做一次普通 VACUUM (ANALYZE)（不锁表，需在事务外执行）
+    """
+    info = {"backend": engine.dialect.name}
+    with engine.connect() as conn:
+        conn = conn.execution_options(isolation_level="AUTOCOMMIT")
+        for table in (Share.__table__, FileStat.__table__):
+            conn.execute(text(f"VACUUM (ANALYZE) {conn.dialect.identifier_preparer.format_table(table)}"))
+        info["size_bytes"] = conn.execute(text("SELECT pg_database_size(current_database())")).scalar()
+    return info
+
+# =========================
+# Runner
+# =========================
+def run_maintenance() -> dict:
+    # 手动触发与后台循环互斥：已有一轮在跑时直接返回当前统计
+    if not _run_lock.acquire(blocking=False):
+        return get_stats()
+    try:
+        return _run_maintenance()
+    finally:
+        _run_lock.release()
+
+def _run_maintenance() -> dict:
+    started = time.monotonic()
+    s = SessionLocal()
+    try:
+        purged = purge_dead_shares(s, datetime.utcnow())
+        orphans = prune_orphans(s)
+        # 本地缓存（含固定的视频片段）里已删除文件的条目
+        orphans += cache.prune(dict(s.query(File.id, File.sha256).all()))
+        db_info = compact()
+        db_info["files"] = s.query(File).count()
+        db_info["shares"] = s.query(Share).count()
+        error = None
+    except Exception as e:
+        logger.exception("maintenance failed")
+        s.rollback()
+        purged = orphans = 0
+        db_info = {}
+        error = str(e)
+    finally:
+        s.close()
+
+    last = {"shares_purged": purged, "orphans_pruned": orphans}
+    with _stats_lock:
+        _stats["runs"] += 1
+        _stats["last_run_at"] = datetime.utcnow().isoformat()
+        _stats["last_duration_ms"] = int((time.monotonic() - started) * 1000)
+        _stats["last_error"] = error
+        _stats["last"] = last
+        _stats["totals"]["shares_purged"] += purged
+        _stats["totals"]["orphans_pruned"] += orphans
+        if db_info:
+            _stats["db"] = db_info
+    logger.info("maintenance done: %s %s", last, db_info)
+    return get_stats()
+
+def maintenance_loop(stop: threading.Event):
+    if MAINTENANCE_INTERVAL_MINUTES <= 0:
+        return
+    # 启动后先跑一轮，再按间隔执行
+    while not stop.is_set():
+        run_maintenance()
+        stop.wait(MAINTENANCE_INTERVAL_MINUTES * 60)
@@ -1,6 +1,6 @@
 from sqlalchemy import (
     Column, Integer, String, DateTime,
-    ForeignKey, Boolean
+    ForeignKey, Boolean, Text, BigInteger
 )
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -28,17 +28,52 @@ class File(Base):
         cascade="all, delete-orphan"
     )
 
+    stat = relationship(
+        "FileStat",
+        uselist=False,
+        cascade="all, delete-orphan"
+    )
+
+    codec = relationship(
+        "FileCodec",
+        uselist=False,
+        cascade="all, delete-orphan"
+    )
+
 
 class Share(Base):
     __tablename__ = "shares"
 
     id = Column(Integer, primary_key=True)
     token = Column(String, unique=True, nullable=False)
-    file_id = Column(Integer, ForeignKey("files.id"), nullable=False)
+    file_id = Column(Integer, ForeignKey("files.id"), nullable=False, index=True)
 
     file = relationship("File", back_populates="shares")
 
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
     revoked = Column(Boolean, default=False)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+
+
+class FileStat(Base):
+    __tablename__ = "file_stats"
+
+    # 访问统计：内存计数，后台批量刷入
+    file_id = Column(Integer, ForeignKey("files.id"), primary_key=True)
+    downloads = Column(Integer, nullable=False, default=0)
+    share_hits = Column(Integer, nullable=False, default=0)
+    last_access_at = Column(DateTime)
+
+
+class FileCodec(Base):
+    __tablename__ = "file_codecs"
+
+    # 以可寻址 zstd 帧存储的文件：频道里是压缩数据，下载时按帧解压
+    file_id = Column(Integer, ForeignKey("files.id"), primary_key=True)
+    codec = Column(String, nullable=False)
+    raw_size = Column(BigInteger, nullable=False)
+    # 每帧原始字节数（最后一帧可能更短）
+    frame_size = Column(Integer, nullable=False)
+    # JSON：每帧压缩后的字节数
+    frames = Column(Text, nullable=False)
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from app import cache
+from app.db import SessionLocal
+from app.models import File, FileCodec, FileStat, Share
+from app.upstream import fetch_range, local_file_path
+from app.config import (
+    CACHE_MAX_MB,
+    PIN_VIDEO_HEAD_MB,
+    PIN_VIDEO_TAIL_MB,
+    PREFETCH_TOP_N,
+    PREFETCH_FULL_MAX_MB,
+    PREFETCH_HEAD_KB,
+    PREFETCH_SHARE_HOURS,
+)
+
+logger = logging.getLogger("prefetch")
+
+_last_run: dict = {}
+
+# =========================
+# Targets
+# =========================
+def prefetch_targets() -> list[tuple[int, str, str, int]]:
+    """
+    [(file_id, sha256, tg_file_path, 预取字节数)]：
+    下载次数 Top-N 尽量整份缓存，最近创建分享的文件只缓存头部；
+    压缩存储的文件缓存的是压缩数据，无法按原始偏移命中，跳过
+    """
+    full = PREFETCH_FULL_MAX_MB * 1024 * 1024
+    head = PREFETCH_HEAD_KB * 1024
+    now = datetime.utcnow()
+
+    s = SessionLocal()
+    try:
+        hot = (
+            s.query(File.id, File.sha256, File.tg_file_path)
+            .join(FileStat, FileStat.file_id == File.id)
+            .outerjoin(FileCodec, FileCodec.file_id == File.id)
+            .filter(FileStat.downloads > 0, FileCodec.file_id.is_(None))
+            .order_by(FileStat.downloads.desc())
+            .limit(PREFETCH_TOP_N)
+            .all()
+        )
+        shared = (
+            s.query(File.id, File.sha256, File.tg_file_path)
+            .join(Share, Share.file_id == File.id)
+            .outerjoin(FileCodec, FileCodec.file_id == File.id)
+            .filter(
+                FileCodec.file_id.is_(None),
+                Share.created_at >= now - timedelta(hours=PREFETCH_SHARE_HOURS),
+                Share.revoked == False,  # noqa: E712
+                Share.expires_at > now,
+            )
+            .distinct()
+            .all()
+        )
+    finally:
+        s.close()
+
+    targets: dict[int, tuple[int, str, str, int]] = {}
+    for fid, sha, path in shared:
+        targets[fid] = (fid, sha, path, head)
+    for fid, sha, path in hot:
+        targets[fid] = (fid, sha, path, full)
+    return list(targets.values())
+
+# =========================
+# Runner
+# =========================
+async def prefetch_once() -> dict:
+    if CACHE_MAX_MB <= 0:
+        return {}
+    fetched = skipped = failed = 0
+    for fid, sha, path, want in prefetch_targets():
+        # 本地 Bot API 模式下文件本来就在磁盘上
+        if local_file_path(path):
+            skipped += 1
+            continue
+        meta = await asyncio.to_thread(cache.lookup, fid, sha)
+        if meta and (meta["head"] >= want or meta["head"] >= meta["size"]):
+            skipped += 1
+            continue
+        try:
+            data, total = await fetch_range(path, 0, want - 1)
+        except Exception as e:
+            logger.warning("prefetch %s failed: %s", fid, e)
+            failed += 1
+            continue
+        await asyncio.to_thread(cache.put_head, fid, sha, data, total)
+        fetched += 1
+    evicted = await asyncio.to_thread(cache.evict)
+
+    _last_run.clear()
+    _last_run.update({
+        "at": datetime.utcnow().isoformat(),
+        "fetched": fetched,
+        "skipped": skipped,
+        "failed": failed,
+        "evicted": evicted,
+    })
+    logger.info("prefetch done: %s", _last_run)
+    return dict(_last_run)
+
+def last_run() -> dict:
+    return dict(_last_run)
+
+# =========================
+# Video pinning（入库时拉取首尾片段）
+# =========================
+async def pin_video(file_id: int, sha256: str, tg_file_path: str, size: int | None = None) -> bool:
+    """
+    播放器起播需要文件头与末尾的 moov，入库时就固定到本地，之后的 Range 请求直接命中
+    """
+    if not cache.pin_enabled() or local_file_path(tg_file_path):
+        return False
+    head_n = PIN_VIDEO_HEAD_MB * 1024 * 1024
+    tail_n = PIN_VIDEO_TAIL_MB * 1024 * 1024
+    head = tail = b""
+    try:
+        if head_n:
+            head, total = await fetch_range(tg_file_path, 0, head_n - 1)
+            size = size or total
+        if not size:
+            return False
+        if tail_n and size > len(head):
+            tail, _ = await fetch_range(tg_file_path, max(len(head), size - tail_n), size - 1)
+    except Exception as e:
+        logger.warning("pin video %s failed: %s", file_id, e)
+        return False
+    await asyncio.to_thread(cache.put_segments, file_id, sha256, size, head, tail, True)
+    return True
@@ -0,0 +1,110 @@
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime
+
+from sqlalchemy import bindparam, insert, update
+
+from app.db import SessionLocal
+from app.models import File, FileStat
+from app.config import STATS_FLUSH_SECONDS, PREFETCH_INTERVAL_SECONDS
+
+logger = logging.getLogger("stats")
+
+# =========================
+# In-memory counters（下载热路径只做字典累加）
+# =========================
+_lock = threading.Lock()
+# file_id -> [downloads, share_hits, last_access_at]
+_pending: dict[int, list] = {}
+
+def record_hit(file_id: int, download: bool = True, share: bool = False):
+    with _lock:
+        row = _pending.get(file_id)
+        if row is None:
+            row = _pending[file_id] = [0, 0, None]
+        row[0] += int(download)
+        row[1] += int(share)
+        row[2] = datetime.utcnow()
+
+def pending() -> dict[int, tuple[int, int, datetime | None]]:
+    with _lock:
+        return {fid: (row[0], row[1], row[2]) for fid, row in _pending.items()}
+
+# =========================
+# Flush（单事务批量 UPDATE + INSERT）
+# =========================
+def flush() -> int:
+    with _lock:
+        if not _pending:
+            return 0
+        batch = dict(_pending)
+        _pending.clear()
+
+    rows = [
+        {"fid": fid, "d": d, "h": h, "at": at}
+        for fid, (d, h, at) in batch.items()
+    ]
+    table = FileStat.__table__
+    s = SessionLocal()
+    try:
+        existing = {
+            fid for (fid,) in
+            s.query(FileStat.file_id).filter(FileStat.file_id.in_(list(batch)))
+        }
+        # 计数期间被删除的文件直接丢弃
+        alive = {
+            fid for (fid,) in
+            s.query(File.id).filter(File.id.in_(list(batch)))
+        }
+        updates = [r for r in rows if r["fid"] in existing]
+        inserts = [
+            {"file_id": r["fid"], "downloads": r["d"], "share_hits": r["h"], "last_access_at": r["at"]}
+            for r in rows if r["fid"] in alive and r["fid"] not in existing
+        ]
+        if updates:
+            s.execute(
+                update(table)
+                .where(table.c.file_id == bindparam("fid"))
+                .values(
+                    downloads=table.c.downloads + bindparam("d"),
+                    share_hits=table.c.share_hits + bindparam("h"),
+                    last_access_at=bindparam("at"),
+                ),
+                updates,
+            )
+        if inserts:
+            s.execute(insert(table), inserts)
+        s.commit()
+    except Exception:
+        s.rollback()
+        # 刷库失败：把计数放回去，下一轮再试
+        with _lock:
+            for fid, (d, h, at) in batch.items():
+                row = _pending.setdefault(fid, [0, 0, at])
+                row[0] += d
+                row[1] += h
+        logger.exception("stats flush failed")
+        return 0
+    finally:
+        s.close()
+    return len(rows)
+
+# =========================
+# Background loop（刷库 + 定期预取）
+# =========================
+def stats_loop(stop: threading.Event):
+    from app.prefetch import prefetch_once
+
+    next_prefetch = time.monotonic()
+    while not stop.is_set():
+        flush()
+        if PREFETCH_INTERVAL_SECONDS > 0 and time.monotonic() >= next_prefetch:
+            try:
+                asyncio.run(prefetch_once())
+            except Exception:
+                logger.exception("prefetch failed")
+            next_prefetch = time.monotonic() + PREFETCH_INTERVAL_SECONDS
+        stop.wait(STATS_FLUSH_SECONDS)
+    flush()
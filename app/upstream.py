@@ -0,0 +1,158 @@
+import os
+import asyncio
+
+import httpx
+from fastapi import HTTPException
+
+from app.config import BOT_TOKEN, TG_API_BASE_URL, TG_LOCAL_PATH_MAP
+
+# =========================
+# Telegram 文件地址
+# =========================
+def is_full_url(v: str) -> bool:
+    return v.startswith("http://") or v.startswith("https://")
+
+def build_tg_download_url(path: str) -> str:
+    path = (path or "").strip()
+    if is_full_url(path):
+        return path
+    return f"{TG_API_BASE_URL}/file/bot{BOT_TOKEN}/{path.lstrip('/')}"
+
+def local_file_path(path: str) -> str | None:
+    """
+    本地 Bot API 模式下 file_path 是共享卷上的绝对路径：存在则直接读盘，不走 HTTP
+    """
+    path = (path or "").strip()
+    if not path or is_full_url(path) or not os.path.isabs(path):
+        return None
+    if TG_LOCAL_PATH_MAP and "=" in TG_LOCAL_PATH_MAP:
+        src, dst = TG_LOCAL_PATH_MAP.split("=", 1)
+        if path.startswith(src):
+            path = dst + path[len(src):]
+    return path if os.path.isfile(path) else None
+
+# =========================
+# Upstream stream（支持 Range）
+# =========================
+async def iter_telegram_bytes(tg_file_path: str, headers: dict | None = None):
+    path = local_file_path(tg_file_path)
+    if path:
+        async for c in iter_local_file(path):
+            yield c
+        return
+    tg_url = build_tg_download_url(tg_file_path)
+    async with httpx.AsyncClient(timeout=None) as client:
+        async with client.stream("GET", tg_url, headers=headers or {}) as r:
+            r.raise_for_status()
+            async for c in r.aiter_bytes():
+                yield c
+
+async def iter_local_file(path: str, chunk_size: int = 64 * 1024):
+    with open(path, "rb") as fp:
+        while True:
+            c = await asyncio.to_thread(fp.read, chunk_size)
+            if not c:
+                break
+            yield c
+
+async def open_telegram_stream(tg_file_path: str, headers: dict) -> httpx.Response:
+    """
+    先拿到上游响应头（状态码 / Content-Length / Content-Range）再开始回传，
+    调用方负责 aclose()
+    """
+    client = httpx.AsyncClient(timeout=None)
+    # 透传 Content-Length 时要求上游不要压缩
+    headers = {**headers, "Accept-Encoding": "identity"}
+    try:
+        req = client.build_request("GET", build_tg_download_url(tg_file_path), headers=headers)
+        r = await client.send(req, stream=True)
+    except Exception:
+        await client.aclose()
+        raise HTTPException(502, "upstream unavailable")
+    r.extensions["client"] = client
+    if r.status_code >= 400:
+        await close_telegram_stream(r)
+        if r.status_code == 416:
+            raise HTTPException(416, headers={
+                k: v for k, v in r.headers.items() if k.lower() == "content-range"
+            })
+        raise HTTPException(502, f"upstream status {r.status_code}")
+    return r
+
+async def close_telegram_stream(r: httpx.Response):
+    await r.aclose()
+    await r.extensions["client"].aclose()
+
+
+def parse_content_range_total(value: str | None) -> int | None:
+    # "bytes 0-99/12345" -> 12345
+    if not value or "/" not in value:
+        return None
+    total = value.rsplit("/", 1)[1].strip()
+    return int(total) if total.isdigit() else None
+
+async def fetch_range(tg_file_path: str, start: int, end: int) -> tuple[bytes, int | None]:
+    """
+    读取 [start, end] 闭区间字节，返回 (数据, 文件总大小)；供预取 / 片段缓存使用
+    """
+    r = await open_telegram_stream(tg_file_path, {"Range": f"bytes={start}-{end}"})
+    try:
+        want = end - start + 1
+        # 上游忽略了 Range（200 整份返回）：边读边跳过前 start 个字节
+        skip = 0 if r.status_code == 206 else start
+        buf = bytearray()
+        async for chunk in r.aiter_bytes():
+            if skip:
+                if len(chunk) <= skip:
+                    skip -= len(chunk)
+                    continue
+                chunk = chunk[skip:]
+                skip = 0
+            buf += chunk
+            if len(buf) >= want:
+                break
+        if r.status_code == 206:
+            total = parse_content_range_total(r.headers.get("content-range"))
+        else:
+            total = int(r.headers["content-length"]) if "content-length" in r.headers else None
+        return bytes(buf[:want]), total
+    finally:
+        await close_telegram_stream(r)
+
+async def iter_range(tg_file_path: str, start: int, end: int):
+    """
+    读取 [start, end] 闭区间（本地路径直接 seek，远端走 Range 请求）
+    """
+    path = local_file_path(tg_file_path)
+    if path:
+        with open(path, "rb") as fp:
+            fp.seek(start)
+            left = end - start + 1
+            while left > 0:
+                c = await asyncio.to_thread(fp.read, min(64 * 1024, left))
+                if not c:
+                    break
+                left -= len(c)
+                yield c
+        return
+
+    r = await open_telegram_stream(tg_file_path, {"Range": f"bytes={start}-{end}"})
+    try:
+        # 上游忽略 Range 时（200）自己跳过前面的字节
+        skip = start if r.status_code == 200 else 0
+        left = end - start + 1
+        async for c in r.aiter_bytes():
+            if skip:
+                if len(c) <= skip:
+                    skip -= len(c)
+                    continue
+                c = c[skip:]
+                skip = 0
+            if len(c) > left:
+                c = c[:left]
+            left -= len(c)
+            yield c
+            if left <= 0:
+                break
+    finally:
+        await close_telegram_stream(r)
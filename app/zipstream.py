@@ -0,0 +1,167 @@
+import struct
+import asyncio
+import logging
+import zlib
+from datetime import datetime
+from typing import AsyncIterator, Callable, NamedTuple
+
+logger = logging.getLogger("zipstream")
+
+# =========================
+# ZIP64 常量（仅 stored 模式，不压缩）
+# =========================
+ZIP_VERSION = 45              # 4.5：支持 ZIP64
+FLAGS = 0x0808                # bit3：尾部数据描述符；bit11：UTF-8 文件名
+METHOD_STORED = 0
+MAX32 = 0xFFFFFFFF
+MAX16 = 0xFFFF
+
+
+class ZipEntry(NamedTuple):
+    name: str
+    modified: datetime
+    # 每次调用返回一个新的字节流（通常是 Telegram 上游）
+    open: Callable[[], AsyncIterator[bytes]]
+
+
+def dos_datetime(dt: datetime) -> tuple[int, int]:
+    # DOS 时间最早只能表示 1980 年
+    if dt.year < 1980:
+        dt = datetime(1980, 1, 1)
+    t = (dt.hour << 11) | (dt.minute << 5) | (dt.second // 2)
+    d = ((dt.year - 1980) << 9) | (dt.month << 5) | dt.day
+    return t, d
+
+def unique_names(names: list[str]) -> list[str]:
+    """
+    同名文件追加序号：a.txt, a (2).txt, a (3).txt ...
+    """
+    seen: dict[str, int] = {}
+    result = []
+    for name in names:
+        name = (name or "unnamed").replace("\\", "_").lstrip("/")
+        key = name.lower()
+        n = seen.get(key, 0) + 1
+        seen[key] = n
+        if n > 1:
+            stem, dot, ext = name.rpartition(".")
+            name = f"{stem} ({n}).{ext}" if dot and stem else f"{name} ({n})"
+        result.append(name)
+    return result
+
+# =========================
+# Records
+# =========================
+def local_header(name: bytes, t: int, d: int) -> bytes:
+    # 大小未知：写 0xFFFFFFFF + 全 0 的 ZIP64 extra，真实值放在数据描述符里
+    extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+    return struct.pack(
+        "<IHHHHHIIIHH",
+        0x04034B50, ZIP_VERSION, FLAGS, METHOD_STORED, t, d,
+        0, MAX32, MAX32, len(name), len(extra),
+    ) + name + extra
+
+def data_descriptor(crc: int, size: int) -> bytes:
+    return struct.pack("<IIQQ", 0x08074B50, crc, size, size)
+
+def central_header(name: bytes, t: int, d: int, crc: int, size: int, offset: int) -> bytes:
+    extra = struct.pack("<HHQQQ", 0x0001, 24, size, size, offset)
+    return struct.pack(
+        "<IHHHHHHIIIHHHHHII",
+        0x02014B50, ZIP_VERSION, ZIP_VERSION, FLAGS, METHOD_STORED, t, d,
+        crc, MAX32, MAX32, len(name), len(extra), 0, 0, 0, 0, MAX32,
+    ) + name + extra
+
+def end_records(count: int, cd_offset: int, cd_size: int) -> bytes:
+    zip64_eocd_offset = cd_offset + cd_size
+    zip64_eocd = struct.pack(
+        "<IQHHIIQQQQ",
+        0x06064B50, 44, ZIP_VERSION, ZIP_VERSION, 0, 0,
+        count, count, cd_size, cd_offset,
+    )
+    locator = struct.pack("<IIQI", 0x07064B50, 0, zip64_eocd_offset, 1)
+    eocd = struct.pack(
+        "<IHHHHIIH",
+        0x06054B50, 0, 0, MAX16, MAX16, MAX32, MAX32, 0,
+    )
+    return zip64_eocd + locator + eocd
+
+# =========================
+# Prefetch
+# =========================
+async def _pump(entry: ZipEntry, queue: asyncio.Queue):
+    """
+    把上游字节流灌进有界队列；队列满时自然阻塞，内存占用恒定
+    """
+    try:
+        async for chunk in entry.open():
+            if chunk:
+                await queue.put(chunk)
+        await queue.put(None)
+    except Exception as e:
+        await queue.put(e)
+
+async def stream_zip(
+    entries: list[ZipEntry],
+    prefetch: int = 2,
+    queue_chunks: int = 16,
+) -> AsyncIterator[bytes]:
+    """
+    流式生成 ZIP64（stored）归档：写当前条目时，后面 prefetch 个条目已经在并发拉取
+    """
+    names = unique_names([e.name for e in entries])
+    queues: list[asyncio.Queue | None] = [None] * len(entries)
+    tasks: list[asyncio.Task] = []
+
+    def start(i: int):
+        if i < len(entries) and queues[i] is None:
+            queues[i] = asyncio.Queue(maxsize=queue_chunks)
+            tasks.append(asyncio.create_task(_pump(entries[i], queues[i])))
+
+    central = []
+    offset = 0
+    try:
+        for i in range(min(prefetch + 1, len(entries))):
+            start(i)
+
+        for i, entry in enumerate(entries):
+            start(i)
+            name = names[i].encode("utf-8")
+            t, d = dos_datetime(entry.modified)
+
+            header = local_header(name, t, d)
+            entry_offset = offset
+            offset += len(header)
+            yield header
+
+            crc = 0
+            size = 0
+            queue = queues[i]
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                crc = zlib.crc32(item, crc)
+                size += len(item)
+                offset += len(item)
+                yield item
+            queues[i] = None
+            start(i + prefetch + 1)
+
+            desc = data_descriptor(crc, size)
+            offset += len(desc)
+            yield desc
+            central.append(central_header(name, t, d, crc, size, entry_offset))
+
+        cd_offset = offset
+        cd = b"".join(central)
+        yield cd
+        yield end_records(len(central), cd_offset, len(cd))
+    except Exception:
+        logger.exception("zip stream aborted")
+        raise
+    finally:
+        for task in tasks:
+            task.cancel()